@@ -15,17 +15,85 @@
 
 import collections
 import io
-
-from collections.abc import Iterable
+import os
+import pickle
 
 import cloudpickle
+import numpy as np
 import torch
 
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
 from horovod.torch.mpi_ops import allgather, broadcast_, broadcast_async_
 from horovod.torch.mpi_ops import synchronize
-from horovod.torch.mpi_ops import rank, size
+from horovod.torch.mpi_ops import rank
 from horovod.torch.optimizer import DistributedOptimizer
 
+try:
+    from torch.utils._pytree import tree_flatten as _tree_flatten
+    from torch.utils._pytree import tree_unflatten as _tree_unflatten
+except ImportError:
+    # Older versions of PyTorch have no pytree utilities, only nested lists and
+    # tuples need to be supported for optimizer options
+    def _tree_flatten(x):
+        if not isinstance(x, (list, tuple)):
+            return [x], None
+
+        leaves = []
+        specs = []
+        for xi in x:
+            xi_leaves, xi_spec = _tree_flatten(xi)
+            leaves.extend(xi_leaves)
+            specs.append((len(xi_leaves), xi_spec))
+        return leaves, (type(x), specs)
+
+    def _tree_unflatten(leaves, spec):
+        if spec is None:
+            return leaves[0]
+
+        t, specs = spec
+        values = []
+        offset = 0
+        for num_leaves, xi_spec in specs:
+            values.append(_tree_unflatten(leaves[offset:offset + num_leaves], xi_spec))
+            offset += num_leaves
+        return t(values)
+
+# Size of each little-endian int64 entry of the header prepended to broadcast objects
+_HEADER_ITEM_BYTES = 8
+
+# Pickle protocol 5 allows large buffers to be serialized out-of-band (Python 3.8+)
+_PICKLE_OUT_OF_BAND = pickle.HIGHEST_PROTOCOL >= 5
+
+# Optimizers whose state only consists of tensors shaped like the parameters and
+# scalar counters, so it can be initialized without stepping over every parameter
+_PREALLOCATED_STATE_OPTIMIZERS = (torch.optim.SGD, torch.optim.Adam, torch.optim.AdamW,
+                                  torch.optim.RMSprop)
+
+
+def _bucket_by_dtype_device(params, bucket_bytes=25 * 1024 * 1024):
+    """
+    Groups a list of `(name, tensor)` pairs into buckets of tensors that share
+    the same dtype and device, each bucket holding at most `bucket_bytes` bytes
+    (a single tensor larger than that gets a bucket of its own).
+
+    Buckets are returned in the order their first tensor appears in `params`,
+    so every rank issues the resulting collectives in the same order.
+    """
+    buckets = []
+    open_buckets = {}
+    for name, p in params:
+        key = (p.dtype, p.device)
+        nbytes = p.numel() * p.element_size()
+        bucket = open_buckets.get(key)
+        if bucket is None or bucket[1] + nbytes > bucket_bytes:
+            bucket = [[], 0]
+            open_buckets[key] = bucket
+            buckets.append(bucket[0])
+        bucket[0].append((name, p))
+        bucket[1] += nbytes
+    return buckets
+
 
 def broadcast_parameters(params, root_rank):
     """
@@ -48,15 +116,119 @@ def broadcast_parameters(params, root_rank):
     else:
         raise ValueError('invalid params of type: %s' % type(params))
 
-    # Run asynchronous broadcasts.
-    handles = []
+    # Tied parameters (e.g. shared embedding and output weights) appear more than
+    # once but share the same memory, so only their first occurrence is broadcast
+    seen = set()
+    unique_params = []
     for name, p in params:
-        handle = broadcast_async_(p, root_rank, name)
-        handles.append(handle)
+        alias_key = (p.data_ptr(), p.dtype, p.device, p.size(), p.stride())
+        if alias_key in seen:
+            continue
+        seen.add(alias_key)
+        unique_params.append((name, p))
+
+    _broadcast_parameters(unique_params, root_rank)
 
-    # Wait for completion.
-    for handle in handles:
+
+def _broadcast_parameters(params, root_rank, callbacks=None, max_inflight=16):
+    """
+    Broadcasts a list of `(name, tensor)` pairs, keeping at most `max_inflight`
+    broadcasts outstanding. As soon as the broadcast of a tensor completes,
+    `callbacks[name]` is invoked if present, overlapping the callback with the
+    broadcasts still in flight.
+    """
+    if callbacks is None:
+        callbacks = {}
+
+    # The root rank already holds the broadcast values in its parameters
+    is_root = rank() == root_rank
+
+    def _complete(handle, bucket, flat):
         synchronize(handle)
+        if flat is not None and not is_root:
+            tensors = [p.data for _, p in bucket]
+            for tensor, synced in zip(tensors, _unflatten_dense_tensors(flat, tensors)):
+                tensor.copy_(synced)
+        for name, _ in bucket:
+            if name in callbacks:
+                callbacks[name]()
+
+    # Run asynchronous broadcasts, coalescing parameters of the same dtype and
+    # device into flat buffers so that many small tensors cost a single collective.
+    inflight = collections.deque()
+    for bucket in _bucket_by_dtype_device(params):
+        if len(inflight) >= max_inflight:
+            _complete(*inflight.popleft())
+
+        if len(bucket) == 1:
+            name, p = bucket[0]
+            inflight.append((broadcast_async_(p, root_rank, name), bucket, None))
+            continue
+
+        flat = _flatten_dense_tensors([p.data for _, p in bucket])
+        first_name = bucket[0][0]
+        name = 'bucket.%s' % first_name if first_name is not None else None
+        inflight.append((broadcast_async_(flat, root_rank, name), bucket, flat))
+
+    # Wait for the remaining broadcasts and copy the bucket contents back into the parameters.
+    while inflight:
+        _complete(*inflight.popleft())
+
+
+def _preallocate_optimizer_state(optimizer):
+    """
+    Initializes the state of a known optimizer class without running a step over
+    all of its parameters. The state layout of each param group is taken from a
+    step of the same optimizer over a small proxy parameter, so it matches the
+    installed version of PyTorch, then replicated with `torch.zeros_like` for
+    every parameter.
+
+    Returns `False` if the optimizer is not supported or its state does not
+    start at zero, in which case its state has to be initialized by calling
+    `step()`.
+    """
+    cls = optimizer.__class__
+    if optimizer.__module__ == DistributedOptimizer.__module__:
+        cls = cls.__bases__[0]
+    if cls not in _PREALLOCATED_STATE_OPTIMIZERS:
+        return False
+
+    templates = []
+    for group in optimizer.param_groups:
+        params = [p for p in group['params'] if p.requires_grad]
+        if not params:
+            continue
+        if any(p.dtype != params[0].dtype or p.device != params[0].device for p in params):
+            return False
+
+        proxy_param = torch.zeros(2, 3, dtype=params[0].dtype, device=params[0].device,
+                                  requires_grad=True)
+        proxy_param.grad = torch.zeros_like(proxy_param)
+        proxy_group = {k: v for k, v in group.items() if k != 'params'}
+        proxy_group['params'] = [proxy_param]
+        proxy = cls([proxy_group], lr=group['lr'])
+        proxy.step()
+
+        # Param-shaped state is replicated as zeros, so any other layout or
+        # initial value is left to step()
+        template = proxy.state[proxy_param]
+        for value in template.values():
+            if torch.is_tensor(value) and value.dim() != 0 and (
+                    value.shape != proxy_param.shape or value.any()):
+                return False
+        templates.append((params, template))
+
+    for params, template in templates:
+        if not template:
+            # Stateless optimizer, e.g. SGD without momentum
+            continue
+        for p in params:
+            optimizer.state[p] = {
+                k: torch.zeros_like(p, dtype=v.dtype) if torch.is_tensor(v) and v.dim() != 0
+                else v.clone() if torch.is_tensor(v) else v
+                for k, v in template.items()
+            }
+    return True
 
 
 def broadcast_optimizer_state(optimizer, root_rank):
@@ -79,19 +251,39 @@ def broadcast_optimizer_state(optimizer, root_rank):
     # Newly created optimizers will not have their state initialized, so
     # do that initialization here
     if len(state_dict['state']) == 0:
+        grad_params = []
         for group in optimizer.param_groups:
             for p in group['params']:
                 if p.requires_grad and id(p) not in state_dict['state']:
-                    p.grad = p.data.new(p.size()).zero_()
-        # This function accepts a torch.optim.Optimizer or a DistributedOptimizer
-        # wrapped around a torch optimizer. Calling step() with a DistributedOptimizer
-        # forces allreduce on all model parameters, which will result in deadlock
-        # unless every rank calls step(). Therefore, to finish state initialization
-        # only call optimizer.step() with a torch.optim.Optimizer.
-        if optimizer.__module__ == DistributedOptimizer.__module__:
-            super(optimizer.__class__, optimizer).step()
-        else:
-            optimizer.step()
+                    if p.is_contiguous():
+                        grad_params.append((None, p))
+                    else:
+                        p.grad = p.data.new(p.size()).zero_()
+
+        # Zero gradients of the same dtype and device are carved out of a single
+        # zeroed buffer, sharing its storage without being autograd views of it.
+        # The bucket size cap only matters for broadcast latency, not here.
+        for bucket in _bucket_by_dtype_device(grad_params, bucket_bytes=float('inf')):
+            flat = torch.zeros(sum(p.numel() for _, p in bucket),
+                               dtype=bucket[0][1].dtype, device=bucket[0][1].device)
+            storage = flat.untyped_storage() if hasattr(flat, 'untyped_storage') else flat.storage()
+            offset = 0
+            for _, p in bucket:
+                p.grad = flat.new_empty(0).set_(storage, offset, p.size(), p.stride())
+                offset += p.numel()
+
+        # Known optimizers have their state allocated directly, the others are
+        # initialized by a step over the zero gradients.
+        if not _preallocate_optimizer_state(optimizer):
+            # This function accepts a torch.optim.Optimizer or a DistributedOptimizer
+            # wrapped around a torch optimizer. Calling step() with a DistributedOptimizer
+            # forces allreduce on all model parameters, which will result in deadlock
+            # unless every rank calls step(). Therefore, to finish state initialization
+            # only call optimizer.step() with a torch.optim.Optimizer.
+            if optimizer.__module__ == DistributedOptimizer.__module__:
+                super(optimizer.__class__, optimizer).step()
+            else:
+                optimizer.step()
         state_dict = optimizer.state_dict()
 
     # If the state_dict is still empty after initialization, then
@@ -103,36 +295,30 @@ def broadcast_optimizer_state(optimizer, root_rank):
 
     params = []
     callbacks = {}
-    occurrences = collections.defaultdict(int)
-
-    # Returns the full type structure of the possibly nested objects for recursive casting back
-    def _get_types(x):
-        if isinstance(x, Iterable):
-            return type(x), [_get_types(xi) for xi in x]
-        else:
-            return type(x)
-
-    # Casts an object encoded in a tensor back into its original type and subtypes
-    def _recursive_cast(x, dtype):
-        if isinstance(dtype, tuple):
-            t, dtypes = dtype
-            x = t(x)
-            return t([_recursive_cast(x[i], dtypes[i]) for i in range(len(x))])
-        else:
-            return dtype(x)
-
-    # Some optimizer parameters may be represented as scalars instead of
-    # tensors.  In such cases, we need to wrap the scalar in a tensor, then
-    # broadcast, then update the appropriate value in the state_dict with the
-    # new unwrapped scalar value via a callback.
-    def _create_callback(pid, name, t, p):
+    scalar_values = []
+    option_scalars = []
+    state_scalars = []
+    state_tensors = {}
+
+    # Bound once as locals for the loop over the parameter states below
+    state = state_dict['state']
+    is_tensor = torch.is_tensor
+    scalar_values_append = scalar_values.append
+    state_scalars_append = state_scalars.append
+
+    # Some optimizer parameters, as well as all the options of the param groups,
+    # are represented as scalars instead of tensors. All of them are wrapped in a
+    # single tensor, broadcast, then the appropriate values are updated in the
+    # state_dict and param groups with the new unwrapped scalars via a callback.
+    def _create_scalars_callback(scalar_tensor):
         def _from_tensor():
-            state_dict['state'][pid][name] = t(p.cpu().numpy()[0])
-        return _from_tensor
-
-    def _create_option_callback(index, option_key, option_tensor, dtypes):
-        def _from_tensor():
-            optimizer.param_groups[index][option_key] = _recursive_cast(option_tensor.cpu().numpy()[0], dtypes)
+            values = scalar_tensor.tolist()
+            for index, option_key, offset, leaf_types, spec in option_scalars:
+                leaves = values[offset:offset + len(leaf_types)]
+                leaves = [t(leaf) for t, leaf in zip(leaf_types, leaves)]
+                optimizer.param_groups[index][option_key] = _tree_unflatten(leaves, spec)
+            for param_state, name, offset, t in state_scalars:
+                param_state[name] = t(values[offset])
         return _from_tensor
 
     # Param groups are an ordered list, normally there is only one per model,
@@ -144,43 +330,72 @@ def broadcast_optimizer_state(optimizer, root_rank):
             if option_key == 'params':
                 continue
 
-            # Options like the learning rate are scalar, and need to be wrapped in tensors
-            key = '%s.%d' % (option_key, index)
-            dtypes = _get_types(option_value)
-            option_tensor = torch.Tensor([option_value])
-            callbacks[key] = _create_option_callback(index, option_key, option_tensor, dtypes)
-            params.append((key, option_tensor))
+            # Options like the learning rate are scalar, so they are flattened into
+            # their scalar leaves, remembering the leaf types and the structure to
+            # rebuild them
+            leaves, spec = _tree_flatten(option_value)
+            option_scalars.append((index, option_key, len(scalar_values),
+                                   [type(leaf) for leaf in leaves], spec))
+            scalar_values.extend(leaves)
 
         # The params list here is ordered by the layers in the model
         for pid in group['params']:
-            if pid not in state_dict['state']:
+            param_state = state.get(pid)
+            if param_state is None:
                 # The param has not set requires_grad, so skip broadcast
                 continue
 
-            param_state = state_dict['state'][pid]
             for name, p in param_state.items():
-                # Some parameter names may appear more than once, in which
-                # case we ensure they have a unique identifier defined by
-                # their order
-                occurrences[name] += 1
-                key = '%s.%d' % (str(name), occurrences[name])
-
-                if not torch.is_tensor(p):
-                    # Wrap the scalar in a FloatTensor, and remember its type
-                    # so we can cast it back after unwrapping
-                    t = type(p)
-                    p = torch.Tensor([p])
-                    callbacks[key] = _create_callback(pid, name, t, p)
-
-                params.append((key, p))
+                if not is_tensor(p):
+                    # Remember the scalar and its type so we can cast it back
+                    # after unwrapping
+                    state_scalars_append((param_state, name, len(scalar_values), type(p)))
+                    scalar_values_append(p)
+                    continue
+
+                named_tensors = state_tensors.get(name)
+                if named_tensors is None:
+                    state_tensors[name] = [p]
+                else:
+                    named_tensors.append(p)
+
+    # Some parameter names may appear more than once, in which case we ensure
+    # they have a unique identifier defined by their order
+    for name, named_tensors in state_tensors.items():
+        for occurrence, p in enumerate(named_tensors, 1):
+            params.append(('%s.%d' % (str(name), occurrence), p))
+
+    # Wrap all the scalars in a single DoubleTensor, broadcast in one collective
+    # issued ahead of the tensors
+    if scalar_values:
+        scalar_tensor = torch.as_tensor(scalar_values, dtype=torch.float64)
+        callbacks['scalars'] = _create_scalars_callback(scalar_tensor)
+        params.insert(0, ('scalars', scalar_tensor))
+
+    # Synchronized broadcast of all parameters, with post-broadcast cleanup
+    # for non-tensor parameters run as their broadcasts complete
+    _broadcast_parameters(params, root_rank, callbacks)
+
+
+def _serialize(obj, buffer_callback=None):
+    """
+    Pickles `obj` into a uint8 tensor that shares memory with the pickle buffer.
+    If `buffer_callback` is given, pickle protocol 5 is used and the callback
+    decides which buffers are serialized out-of-band.
+    """
+    b = io.BytesIO()
+    if buffer_callback is None:
+        cloudpickle.dump(obj, b)
+    else:
+        cloudpickle.Pickler(b, protocol=5, buffer_callback=buffer_callback).dump(obj)
+    return torch.from_numpy(np.frombuffer(b.getbuffer(), dtype=np.uint8))
 
-    # Synchronized broadcast of all parameters
-    broadcast_parameters(params, root_rank)
 
-    # Post-broadcast cleanup for non-tensor parameters
-    for key, p in params:
-        if key in callbacks:
-            callbacks[key]()
+def _deserialize(byte_array, buffers=None):
+    """Unpickles an object directly from a contiguous uint8 numpy array."""
+    if buffers:
+        return cloudpickle.loads(memoryview(byte_array), buffers=buffers)
+    return cloudpickle.loads(memoryview(byte_array))
 
 
 def broadcast_object(obj, root_rank=0, name=None):
@@ -194,6 +409,11 @@ def broadcast_object(obj, root_rank=0, name=None):
         if hvd.rank() > 0:
             optimizer.load_state_dict(state_dict)
 
+    Objects whose serialized size fits in `HOROVOD_BROADCAST_OBJECT_MAX_BYTES`
+    (64 KiB by default, must be the same on all ranks) are sent with a single
+    broadcast. Larger contiguous buffers, like numpy arrays, are broadcast
+    out-of-band of the pickle stream when pickle protocol 5 is available.
+
     Arguments:
         obj: An object capable of being serialized without losing any context.
         root_rank: The rank of the process from which parameters will be
@@ -206,22 +426,67 @@ def broadcast_object(obj, root_rank=0, name=None):
     if name is None:
         name = type(obj).__name__
 
+    # The serialized object is sent together with its length in a fixed size
+    # buffer, so small objects need a single broadcast. Objects that do not
+    # fit are completed by a second broadcast of the remaining bytes.
+    max_bytes = int(os.environ.get('HOROVOD_BROADCAST_OBJECT_MAX_BYTES', 64 * 1024))
+    max_bytes = max(max_bytes, 2 * _HEADER_ITEM_BYTES)
+
     if rank() == root_rank:
-        b = io.BytesIO()
-        cloudpickle.dump(obj, b)
-        t = torch.ByteTensor(bytearray(b.getvalue()))
-        sz = torch.IntTensor([t.shape[0]])
-        broadcast_(sz, root_rank, name + '.sz')
+        # Large buffers exposed through pickle protocol 5 (e.g. numpy arrays) are
+        # broadcast on their own rather than copied into the pickle stream. Their
+        # count is bounded so that the lengths header always fits in one buffer.
+        buffers = []
+        max_buffers = max_bytes // _HEADER_ITEM_BYTES - 2
+
+        def _buffer_callback(buf):
+            with memoryview(buf) as view:
+                in_band = (view.readonly or not view.contiguous or
+                           view.nbytes <= max_bytes or len(buffers) >= max_buffers)
+            if not in_band:
+                buffers.append(torch.from_numpy(np.frombuffer(buf.raw(), dtype=np.uint8)))
+            return in_band
+
+        t = _serialize(obj, _buffer_callback if _PICKLE_OUT_OF_BAND else None)
+        sz = t.shape[0]
+
+        # Header layout: number of out-of-band buffers, pickle stream length, buffer lengths
+        header = np.array([len(buffers), sz] + [buf.shape[0] for buf in buffers], dtype='<i8')
+        header = torch.from_numpy(header.view(np.uint8))
+        header_bytes = header.shape[0]
+        head_bytes = min(sz, max_bytes - header_bytes)
+
+        # Bytes past the payload are never read, so the buffer is left uninitialized
+        head = torch.empty(max_bytes, dtype=torch.uint8, device='cpu')
+        head[:header_bytes] = header
+        head[header_bytes:header_bytes + head_bytes] = t[:head_bytes]
+        broadcast_(head, root_rank, name + '.head')
+        if sz > head_bytes:
+            broadcast_(t[head_bytes:], root_rank, name + '.t')
+        for i, buf in enumerate(buffers):
+            broadcast_(buf, root_rank, '%s.buf.%d' % (name, i))
     else:
-        sz = torch.IntTensor([0])
-        broadcast_(sz, root_rank, name + '.sz')
-        t = torch.ByteTensor(sz.tolist()[0])
+        head = torch.empty(max_bytes, dtype=torch.uint8, device='cpu')
+        broadcast_(head, root_rank, name + '.head')
+        num_buffers, sz = (int(x) for x in head[:2 * _HEADER_ITEM_BYTES].numpy().view('<i8'))
+        header_bytes = (2 + num_buffers) * _HEADER_ITEM_BYTES
+        buffer_sizes = head[2 * _HEADER_ITEM_BYTES:header_bytes].numpy().view('<i8').tolist()
+        head_bytes = min(sz, max_bytes - header_bytes)
+
+        if sz == head_bytes:
+            t = head[header_bytes:header_bytes + sz]
+        else:
+            t = torch.empty(sz, dtype=torch.uint8, device='cpu')
+            t[:head_bytes] = head[header_bytes:]
+            broadcast_(t[head_bytes:], root_rank, name + '.t')
 
-    broadcast_(t, root_rank, name + '.t')
+        buffers = []
+        for i, buf_sz in enumerate(buffer_sizes):
+            buf = torch.empty(buf_sz, dtype=torch.uint8, device='cpu')
+            broadcast_(buf, root_rank, '%s.buf.%d' % (name, i))
+            buffers.append(buf.numpy())
 
-    if rank() != root_rank:
-        buf = io.BytesIO(t.numpy().tobytes())
-        obj = cloudpickle.load(buf)
+        obj = _deserialize(t.numpy(), buffers)
 
     return obj
 
@@ -241,22 +506,11 @@ def allgather_object(obj, name=None):
     if name is None:
         name = type(obj).__name__
 
-    def load(byte_array):
-        buf = io.BytesIO(byte_array.tobytes())
-        return cloudpickle.load(buf)
-
-    b = io.BytesIO()
-    cloudpickle.dump(obj, b)
-
-    t = torch.ByteTensor(bytearray(b.getvalue()))
+    t = _serialize(obj)
     sz = torch.IntTensor([t.shape[0]])
 
-    sizes = allgather(sz, name=name + '.sz').numpy()
-    gathered = allgather(t, name=name + '.t').numpy()
-
-    def select(i):
-        start = sum(sizes[:i])
-        end = start + sizes[i]
-        return gathered[start:end]
+    sizes = allgather(sz, name=name + '.sz').tolist()
+    gathered = allgather(t, name=name + '.t')
 
-    return [load(select(i)) for i in range(size())]
+    # Split into per-rank views of the gathered buffer, unpickled without copies
+    return [_deserialize(chunk.numpy()) for chunk in torch.split(gathered, sizes)]
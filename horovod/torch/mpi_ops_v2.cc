@@ -214,10 +214,14 @@ int DoBroadcastCudaOnCPU(::torch::Tensor tensor, ::torch::Tensor output, int roo
                          const std::string& name) {
   ThrowIfError(common::CheckInitialized());
 
-  // Make async copy of input tensor to CPU tensor and record completion event.
+  // Make async copy of input tensor to a pinned CPU tensor, so that both
+  // device-host copies run at full bandwidth, and record completion event.
+  // Pinned buffers are reused through the host caching allocator.
   auto device = GetDeviceID(tensor);
-  auto cpu_buffer =
-      tensor.to(::torch::Device(::torch::kCPU), /*non_blocking=*/true);
+  auto cpu_buffer = ::torch::empty(
+      tensor.sizes(),
+      tensor.options().device(::torch::kCPU).pinned_memory(true));
+  cpu_buffer.copy_(tensor, /*non_blocking=*/true);
   auto hvd_cpu_buffer = std::make_shared<TorchTensor>(cpu_buffer);
   auto ready_event = RecordReadyEvent(device);
 
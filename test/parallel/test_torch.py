@@ -20,6 +20,7 @@ from distutils.version import LooseVersion
 import inspect
 import itertools
 import os
+import pickle
 import platform
 import unittest
 import warnings
@@ -1261,6 +1262,97 @@ class TorchTests(unittest.TestCase):
                             "gradient %s differs from expected %s, "
                             "error: %s" % (grad_out, expected, str(err)))
 
+    def test_broadcast_parameters_bucketed(self):
+        """Test that many small parameters of mixed dtypes are broadcast correctly."""
+        hvd.init()
+        rank = hvd.rank()
+        root_rank = 0
+
+        dtypes = [torch.FloatTensor, torch.DoubleTensor, torch.IntTensor, torch.LongTensor]
+        if torch.cuda.is_available():
+            dtypes += [torch.cuda.FloatTensor, torch.cuda.DoubleTensor]
+
+        params = {}
+        for i, dtype in enumerate(dtypes * 8):
+            tensor = torch.ones(i % 5 + 1, 3) * (rank + i)
+            params['param.%d' % i] = self.cast_and_place(tensor, dtype)
+        params['scalar'] = torch.tensor(rank, dtype=torch.int64)
+
+        hvd.broadcast_parameters(params, root_rank=root_rank)
+
+        for i, dtype in enumerate(dtypes * 8):
+            expected = self.cast_and_place(torch.ones(i % 5 + 1, 3) * (root_rank + i), dtype)
+            actual = params['param.%d' % i]
+            self.assertEqual(actual.type(), expected.type())
+            self.assertTrue(torch.equal(actual, expected))
+        self.assertEqual(params['scalar'].item(), root_rank)
+
+    def test_broadcast_parameters_tied(self):
+        """Test that parameters sharing the same memory are broadcast correctly."""
+        hvd.init()
+        rank = hvd.rank()
+
+        class TiedModel(nn.Module):
+            def __init__(self):
+                super(TiedModel, self).__init__()
+                self.embedding = nn.Embedding(10, 4)
+                self.output = nn.Linear(4, 10)
+                self.output.weight = self.embedding.weight
+
+        torch.manual_seed(rank)
+        model = TiedModel()
+        state_dict = model.state_dict()
+        self.assertEqual(state_dict['embedding.weight'].data_ptr(),
+                         state_dict['output.weight'].data_ptr())
+
+        hvd.broadcast_parameters(state_dict, root_rank=0)
+
+        torch.manual_seed(0)
+        expected = TiedModel().state_dict()
+        for name, value in model.state_dict().items():
+            self.assertTrue(torch.equal(value, expected[name]), name)
+        self.assertIs(model.output.weight, model.embedding.weight)
+
+    def test_broadcast_parameters_pipelined(self):
+        """Test that callbacks run as soon as their broadcast completes with one broadcast in flight."""
+        from horovod.torch import functions
+
+        hvd.init()
+        rank = hvd.rank()
+        root_rank = 0
+
+        # Each dtype is coalesced into its own bucket, so there are several buckets
+        dtypes = [torch.float32, torch.float64, torch.int32, torch.int64]
+        params = []
+        for i, dtype in enumerate(dtypes * 2):
+            params.append(('param.%d' % i, (torch.ones(i + 1, 3) * (rank + i)).to(dtype)))
+
+        def expected_value(i):
+            return (torch.ones(i + 1, 3) * (root_rank + i)).to(dtypes[i % len(dtypes)])
+
+        completed = []
+
+        def create_callback(i):
+            def _callback():
+                name, tensor = params[i]
+                self.assertTrue(torch.equal(tensor, expected_value(i)), name)
+                completed.append(i)
+
+                # Buckets are issued one at a time, so tensors of dtypes that come
+                # later still hold their original values
+                if rank != root_rank:
+                    for j, (later_name, later_tensor) in enumerate(params):
+                        if dtypes.index(later_tensor.dtype) > dtypes.index(tensor.dtype):
+                            self.assertFalse(torch.equal(later_tensor, expected_value(j)), later_name)
+            return _callback
+
+        callbacks = {name: create_callback(i) for i, (name, _) in enumerate(params)}
+        functions._broadcast_parameters(params, root_rank, callbacks, max_inflight=1)
+
+        self.assertEqual(sorted(completed), list(range(len(params))))
+        for i, (name, tensor) in enumerate(params):
+            self.assertTrue(torch.equal(tensor, expected_value(i)), name)
+
     def test_broadcast_state(self):
         hvd.init()
 
@@ -1506,6 +1598,126 @@ class TorchTests(unittest.TestCase):
         assert optimizer.param_groups[0]['params'][0].grad is None
         assert torch.all(torch.eq(grad, bgrad)).item()
 
+    def test_broadcast_state_preallocated(self):
+        """Test that preallocated optimizer state has the same layout as a step() would create."""
+        hvd.init()
+
+        def create_model():
+            torch.manual_seed(0)
+            return torch.nn.Sequential(
+                torch.nn.Linear(4, 3),
+                torch.nn.ReLU(),
+                torch.nn.Linear(3, 2),
+            )
+
+        def create_optimizer(opt_class, opt_params, model, wrap):
+            optimizer = opt_class(model.parameters(), **opt_params)
+            if wrap:
+                optimizer = hvd.DistributedOptimizer(
+                    optimizer, named_parameters=model.named_parameters())
+            return optimizer
+
+        def get_state_layout(optimizer):
+            layout = []
+            for group in optimizer.param_groups:
+                for p in group['params']:
+                    entries = []
+                    for k, v in optimizer.state[p].items():
+                        if torch.is_tensor(v) and v.dim() != 0:
+                            entries.append((k, tuple(v.shape), v.dtype))
+                        elif torch.is_tensor(v):
+                            entries.append((k, (), v.dtype, v.item()))
+                        else:
+                            entries.append((k, type(v), v))
+                    layout.append(entries)
+            return layout
+
+        opt_configs = [
+            (torch.optim.SGD, dict(lr=0.1, momentum=0.9)),
+            (torch.optim.Adam, dict(lr=0.1, amsgrad=True)),
+            (torch.optim.AdamW, dict(lr=0.1)),
+            (torch.optim.RMSprop, dict(lr=0.1, centered=True, momentum=0.9)),
+        ]
+
+        for (opt_class, opt_params), wrap in itertools.product(opt_configs, [False, True]):
+            # Reference state created by a real step over zero gradients
+            model = create_model()
+            optimizer = opt_class(model.parameters(), **opt_params)
+            for p in model.parameters():
+                p.grad = torch.zeros_like(p)
+            optimizer.step()
+            expected = get_state_layout(optimizer)
+
+            model = create_model()
+            optimizer = create_optimizer(opt_class, opt_params, model, wrap)
+            hvd.broadcast_optimizer_state(optimizer, root_rank=0)
+            actual = get_state_layout(optimizer)
+
+            self.assertEqual(actual, expected, '%s wrap=%s' % (opt_class.__name__, wrap))
+            for p in model.parameters():
+                for v in optimizer.state[p].values():
+                    if torch.is_tensor(v) and v.dim() != 0:
+                        self.assertTrue(torch.equal(v, torch.zeros_like(v)))
+
+        # Subclasses are not known to keep the same state layout, so their
+        # state is initialized by calling step()
+        class CountingSGD(torch.optim.SGD):
+            steps = 0
+
+            def step(self, closure=None):
+                CountingSGD.steps += 1
+                return super(CountingSGD, self).step(closure)
+
+        for wrap in [False, True]:
+            CountingSGD.steps = 0
+            model = create_model()
+            optimizer = create_optimizer(CountingSGD, dict(lr=0.1, momentum=0.9), model, wrap)
+            hvd.broadcast_optimizer_state(optimizer, root_rank=0)
+            self.assertEqual(CountingSGD.steps, 1)
+            self.assertEqual(len(optimizer.state_dict()['state']), 4)
+
+    def test_broadcast_state_zero_grads(self):
+        """Test that initial zero gradients share a single buffer and remain usable."""
+        hvd.init()
+
+        N, D_in, H, D_out = 8, 10, 6, 4
+        x = torch.randn(N, D_in)
+        y = torch.randn(N, D_out)
+
+        model = torch.nn.Sequential(
+            torch.nn.Linear(D_in, H),
+            torch.nn.ReLU(),
+            torch.nn.Linear(H, D_out),
+        )
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9)
+        optimizer = hvd.DistributedOptimizer(optimizer, named_parameters=model.named_parameters())
+
+        hvd.broadcast_parameters(model.state_dict(), root_rank=0)
+        hvd.broadcast_optimizer_state(optimizer, root_rank=0)
+
+        def storage_ptr(t):
+            storage = t.untyped_storage() if hasattr(t, 'untyped_storage') else t.storage()
+            return storage.data_ptr()
+
+        grads = [p.grad for p in model.parameters()]
+        for grad, p in zip(grads, model.parameters()):
+            self.assertIsNotNone(grad)
+            self.assertEqual(grad.shape, p.shape)
+            self.assertTrue(torch.equal(grad, torch.zeros_like(p)))
+            self.assertIsNone(grad._base)
+            self.assertFalse(grad.requires_grad)
+        self.assertEqual(len(set(storage_ptr(grad) for grad in grads)), 1)
+
+        # The shared gradients must not get in the way of regular training steps
+        for _ in range(2):
+            optimizer.zero_grad()
+            loss = F.mse_loss(model(x), y)
+            loss.backward()
+            optimizer.step()
+        for p in model.parameters():
+            self.assertIsNotNone(p.grad)
+            self.assertTrue(torch.isfinite(p.grad).all())
+
     def test_broadcast_object(self):
         hvd.init()
 
@@ -1518,6 +1730,74 @@ class TorchTests(unittest.TestCase):
         obj = hvd.broadcast_object(obj, root_rank=0)
         self.assertDictEqual(obj, expected_obj)
 
+    def test_broadcast_object_large(self):
+        hvd.init()
+
+        # Larger than the default HOROVOD_BROADCAST_OBJECT_MAX_BYTES, so the
+        # object is sent with two broadcasts
+        expected_obj = {
+            'data': b'\x01\x02\x03' * (1024 * 1024),
+            'rank': 0
+        }
+        obj = expected_obj if hvd.rank() == 0 else {}
+
+        obj = hvd.broadcast_object(obj, root_rank=0)
+        self.assertDictEqual(obj, expected_obj)
+
+    def test_broadcast_object_default_gpu(self):
+        """Test that broadcast_object stages bytes on the CPU with a GPU default tensor type."""
+        # Only do this test if there are GPUs available.
+        if not torch.cuda.is_available():
+            self.skipTest("No GPUs available")
+
+        hvd.init()
+
+        # One object fits in the fixed size buffer, the other needs a second broadcast
+        expected_objs = [
+            {'hello': 123, 0: [1, 2]},
+            {'data': b'\x01\x02\x03' * (1024 * 1024), 'rank': 0},
+        ]
+
+        try:
+            torch.set_default_tensor_type(torch.cuda.FloatTensor)
+            for expected_obj in expected_objs:
+                obj = expected_obj if hvd.rank() == 0 else {}
+                obj = hvd.broadcast_object(obj, root_rank=0)
+                self.assertDictEqual(obj, expected_obj)
+        finally:
+            torch.set_default_tensor_type(torch.FloatTensor)
+
+    @pytest.mark.skipif(pickle.HIGHEST_PROTOCOL < 5,
+                        reason='Out-of-band pickle buffers require pickle protocol 5')
+    def test_broadcast_object_numpy(self):
+        hvd.init()
+
+        # Record the broadcasts issued by broadcast_object
+        from horovod.torch import functions
+        broadcast_names = []
+        broadcast_ = functions.broadcast_
+
+        def recording_broadcast_(tensor, root_rank, name=None):
+            broadcast_names.append(name)
+            return broadcast_(tensor, root_rank, name)
+
+        # The large numpy array is sent out-of-band of the pickle stream, the
+        # small one stays in-band
+        expected_arrays = [np.arange(512 * 1024, dtype=np.float64), np.ones((4, 3))]
+        obj = {'arrays': expected_arrays} if hvd.rank() == 0 else {}
+
+        functions.broadcast_ = recording_broadcast_
+        try:
+            obj = hvd.broadcast_object(obj, root_rank=0, name='arrays')
+        finally:
+            functions.broadcast_ = broadcast_
+
+        self.assertEqual(broadcast_names, ['arrays.head', 'arrays.buf.0'])
+        self.assertEqual(len(obj['arrays']), len(expected_arrays))
+        for array, expected in zip(obj['arrays'], expected_arrays):
+            self.assertEqual(array.dtype, expected.dtype)
+            self.assertTrue(np.array_equal(array, expected))
+
     def test_allgather_object(self):
         hvd.init()
 